@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, JSON, Boolean, Float
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, JSON, Boolean, Float, Index
+from sqlalchemy import and_, cast, event, func, inspect, make_url, text, update
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -13,7 +15,47 @@ if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
 
 # Create engine with appropriate connection args
 connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
+engine_args = {
+    "connect_args": connect_args,
+    "insertmanyvalues_page_size": 1000,  # rows per batched INSERT for executemany
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,  # seconds; avoids stale connections under low traffic
+}
+
+database_url = make_url(SQLALCHEMY_DATABASE_URL)
+if database_url.get_backend_name() == "postgresql":
+    engine_args.update(pool_size=10, max_overflow=20)
+    # psycopg2-only option; batches executemany() statements that aren't INSERTs too
+    if database_url.get_driver_name() == "psycopg2":
+        engine_args["executemany_mode"] = "values_plus_batch"
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_args)
+
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers run alongside the single writer; NORMAL only
+        # fsyncs at checkpoints, which is safe in WAL mode
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA cache_size=-64000")  # 64 MB
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        cursor.close()
+
+# Binary JSONB on Postgres (no re-parsing on read, GIN-indexable); plain JSON elsewhere
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+JSON_COLUMNS = ("matched_fields", "matched_values", "click_coordinates")
+
+# Single-column indexes from older versions, now covered by the composite
+# indexes on BlockedRequest
+OBSOLETE_INDEXES = (
+    "ix_blocked_requests_is_bot",
+    "ix_blocked_requests_has_click_correlation",
+    "ix_blocked_requests_target_url",
+    "ix_blocked_requests_target_hostname",
+)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -24,20 +66,31 @@ class BlockedRequest(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
-    target_url = Column(String, index=True)
-    target_hostname = Column(String, index=True)
+    target_url = Column(String)
+    target_hostname = Column(String)
     source_url = Column(String)
-    matched_fields = Column(JSON)  # List of matched field names
-    matched_values = Column(JSON)  # Dict of field names to values
+    matched_fields = Column(JSONType)  # List of matched field names
+    matched_values = Column(JSONType)  # Dict of field names to values
     request_method = Column(String, default="POST")
     status = Column(String, default="detected")  # detected, blocked, allowed
 
     # Human/Bot Classification Fields
-    is_bot = Column(Boolean, nullable=True, index=True)  # True=bot, False=human, None=unknown
+    is_bot = Column(Boolean, nullable=True)  # True=bot, False=human, None=unknown
     click_correlation_id = Column(Integer, nullable=True)  # ID from click_detection.db
     click_time_diff_ms = Column(Integer, nullable=True)  # Time between click and request (ms)
-    click_coordinates = Column(JSON, nullable=True)  # {x: float, y: float}
-    has_click_correlation = Column(Boolean, default=False, index=True)  # Quick filter for correlated requests
+    click_coordinates = Column(JSONType, nullable=True)  # {x: float, y: float}
+    has_click_correlation = Column(Boolean, default=False)  # Quick filter for correlated requests
+
+    # Denormalized: matched_fields and matched_values are both non-empty
+    has_matched_fields = Column(Boolean, default=False)
+
+    __table_args__ = (
+        Index('ix_br_filter', has_matched_fields, is_bot, has_click_correlation, timestamp.desc()),
+        Index('ix_br_classify_time', is_bot, has_click_correlation, timestamp.desc()),
+        Index('ix_br_hostname_time', target_hostname, timestamp),
+        # Containment lookups, e.g. requests that matched a "password" field
+        Index('ix_matched_fields_gin', matched_fields, postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
 
 
 class Whitelist(Base):
@@ -80,5 +133,47 @@ def get_db():
         db.close()
 
 
+def upgrade_db():
+    """Add columns and indexes missing from databases created by older versions"""
+    reflected = inspect(engine).get_columns("blocked_requests")
+    columns = {column["name"] for column in reflected}
+
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for column in reflected:
+                if column["name"] in JSON_COLUMNS and not isinstance(column["type"], JSONB):
+                    conn.execute(text(
+                        f"ALTER TABLE blocked_requests ALTER COLUMN {column['name']} "
+                        f"TYPE JSONB USING {column['name']}::jsonb"
+                    ))
+
+    if "has_matched_fields" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "ALTER TABLE blocked_requests ADD COLUMN has_matched_fields BOOLEAN DEFAULT FALSE"
+            ))
+            # Backfill from the JSON columns; "[]" and "{}" are the only
+            # serialized lists/dicts of length <= 2
+            conn.execute(update(BlockedRequest).values(has_matched_fields=and_(
+                BlockedRequest.matched_fields.isnot(None),
+                BlockedRequest.matched_values.isnot(None),
+                func.length(cast(BlockedRequest.matched_fields, String)) > 2,
+                func.length(cast(BlockedRequest.matched_values, String)) > 2
+            )))
+
+    for index in BlockedRequest.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+    with engine.begin() as conn:
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    upgrade_db()
+
+
+if __name__ == "__main__":
+    init_db()
+    print("Database initialized")
@@ -1,15 +1,37 @@
 from fastapi import FastAPI, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import String, case, cast, func, insert, or_, select
+from sqlalchemy.orm import Session, load_only, raiseload
 from pydantic import BaseModel
 from typing import List, Optional, Dict
+from cachetools import TTLCache
 from datetime import datetime, timedelta
 from urllib.parse import urlparse
-from collections import deque
+from array import array
+from bisect import bisect_left, insort
+import asyncio
+import logging
+import logging.handlers
+import os
+import queue
+import threading
 import database
 
 app = FastAPI(title="Contextfort Security", version="1.0.0")
 
+# Logging: handlers only enqueue records; a listener thread does the
+# (slow, stdio-locking) writes. LOG_LEVEL=WARNING skips per-click messages.
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+
+logger = logging.getLogger("contextfort")
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+logger.propagate = False
+
 # Enable CORS for extension
 app.add_middleware(
     CORSMiddleware,
@@ -19,12 +41,65 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Click Detection: Storage for recent OS clicks (for correlation)
-os_clicks = deque(maxlen=1000)
+# Click Detection: Timestamps of recent OS clicks (for correlation), kept
+# sorted so correlate_click can bisect into the time window. Only mutated
+# from async handlers, i.e. on the event loop thread.
+os_click_timestamps = array('d')
+
+# Click Detection: DOM click rows waiting to be written by click_writer()
+click_write_queue = asyncio.Queue(maxsize=10000)
+click_writer_task = None
+
+# Stats responses, cached briefly since dashboards poll these endpoints.
+# Keys: "stats", "classification", "click_stats"; writes invalidate them.
+STATS_CACHE_TTL_SEC = 5
+stats_cache = TTLCache(maxsize=4, ttl=STATS_CACHE_TTL_SEC)
+stats_cache_lock = threading.Lock()
 
 # Click Detection Config
 TIME_WINDOW_MS = 250
+OS_CLICK_BUFFER_SIZE = 1000
 POSITION_TOLERANCE_PX = 20
+CLICK_BATCH_SIZE = 500
+CLICK_FLUSH_INTERVAL_MS = 50
+
+# Columns needed to build BlockedRequestResponse; list endpoints load only these
+BLOCKED_REQUEST_RESPONSE_COLUMNS = (
+    database.BlockedRequest.id,
+    database.BlockedRequest.timestamp,
+    database.BlockedRequest.target_url,
+    database.BlockedRequest.target_hostname,
+    database.BlockedRequest.source_url,
+    database.BlockedRequest.matched_fields,
+    database.BlockedRequest.matched_values,
+    database.BlockedRequest.request_method,
+    database.BlockedRequest.status,
+    database.BlockedRequest.is_bot,
+    database.BlockedRequest.click_correlation_id,
+    database.BlockedRequest.click_time_diff_ms,
+    database.BlockedRequest.click_coordinates,
+    database.BlockedRequest.has_click_correlation,
+)
+
+# Columns needed to build ClickEventResponse
+CLICK_EVENT_RESPONSE_COLUMNS = (
+    database.ClickEvent.id,
+    database.ClickEvent.timestamp,
+    database.ClickEvent.x,
+    database.ClickEvent.y,
+    database.ClickEvent.is_suspicious,
+    database.ClickEvent.confidence,
+    database.ClickEvent.reason,
+    database.ClickEvent.action_type,
+    database.ClickEvent.action_details,
+    database.ClickEvent.page_url,
+    database.ClickEvent.page_title,
+    database.ClickEvent.target_tag,
+    database.ClickEvent.target_id,
+    database.ClickEvent.target_class,
+    database.ClickEvent.is_trusted,
+    database.ClickEvent.created_at,
+)
 
 
 # Pydantic models
@@ -171,10 +246,40 @@ class ActionSummary(BaseModel):
     suspicious_count: int
 
 
+def get_cached_stats(key: str):
+    with stats_cache_lock:
+        return stats_cache.get(key)
+
+
+def set_cached_stats(key: str, value):
+    with stats_cache_lock:
+        stats_cache[key] = value
+
+
+def invalidate_stats(*keys: str):
+    with stats_cache_lock:
+        for key in keys:
+            stats_cache.pop(key, None)
+
+
 # Initialize database on startup
 @app.on_event("startup")
-def startup_event():
-    database.init_db()
+async def startup_event():
+    global click_writer_task
+    log_listener.start()
+    # Deployments with many workers run `python database.py` once and start
+    # the workers with INIT_DB=0, so they don't all contend on the schema
+    if os.getenv("INIT_DB", "1") == "1":
+        database.init_db()
+    click_writer_task = asyncio.create_task(click_writer())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Sentinel: click_writer flushes whatever is still queued, then exits
+    await click_write_queue.put(None)
+    await click_writer_task
+    log_listener.stop()
 
 
 # API Endpoints
@@ -214,27 +319,22 @@ def create_blocked_request(
     db: Session = Depends(database.get_db)
 ):
     """Store a new blocked request"""
-    db_request = database.BlockedRequest(
-        target_url=request.target_url,
-        target_hostname=request.target_hostname,
-        source_url=request.source_url,
-        matched_fields=request.matched_fields,
-        matched_values=request.matched_values,
-        request_method=request.request_method,
-        status=request.status,
-        # Human/Bot Classification
-        is_bot=request.is_bot,
-        click_correlation_id=request.click_correlation_id,
-        click_time_diff_ms=request.click_time_diff_ms,
-        click_coordinates=request.click_coordinates,
-        has_click_correlation=request.has_click_correlation
-    )
-    db.add(db_request)
+    # RETURNING hands back the generated id/timestamp with the INSERT itself,
+    # so no follow-up SELECT is needed to build the response
+    stmt = insert(database.BlockedRequest).values(
+        **request.model_dump(),
+        has_matched_fields=bool(request.matched_fields) and bool(request.matched_values)
+    ).returning(*BLOCKED_REQUEST_RESPONSE_COLUMNS)
+    db_request = db.execute(stmt).one()
     db.commit()
-    db.refresh(db_request)
+    invalidate_stats("stats", "classification")
     return db_request
 
 
+# List endpoints that load ORM entities pass raiseload('*'), so lazy-loading a
+# relationship per row (N+1 SELECTs) raises instead of silently querying.
+# Keep it on new list queries, and eager-load (selectinload) any relationship
+# the response model actually needs.
 @app.get("/api/blocked-requests", response_model=List[BlockedRequestResponse])
 def get_blocked_requests(
     skip: int = 0,
@@ -243,74 +343,82 @@ def get_blocked_requests(
     db: Session = Depends(database.get_db)
 ):
     """Get all blocked requests with optional filtering - only suspicious requests"""
-    query = db.query(database.BlockedRequest)
-
-    if hostname:
-        query = query.filter(database.BlockedRequest.target_hostname == hostname)
-
-    # Filter to get all requests first
-    all_requests = query.order_by(database.BlockedRequest.timestamp.desc()).all()
-
-    # Filter for suspicious requests only:
+    # Suspicious requests only:
     # 1. Must have matched_fields and matched_values (not empty)
     # 2. Must be suspicious: NOT (is_bot=False AND has_click_correlation=True)
     #    i.e., either is_bot=True OR is_bot=None OR has_click_correlation=False
-    filtered_requests = [
-        req for req in all_requests
-        if req.matched_fields and len(req.matched_fields) > 0
-        and req.matched_values and len(req.matched_values) > 0
-        and not (req.is_bot == False and req.has_click_correlation == True)
-    ]
+    query = db.query(database.BlockedRequest).options(
+        load_only(*BLOCKED_REQUEST_RESPONSE_COLUMNS),
+        raiseload('*')
+    ).filter(
+        database.BlockedRequest.has_matched_fields == True,
+        or_(
+            database.BlockedRequest.is_bot.is_(None),
+            database.BlockedRequest.is_bot == True,
+            database.BlockedRequest.has_click_correlation.is_(None),
+            database.BlockedRequest.has_click_correlation == False
+        )
+    )
 
-    # Apply pagination to filtered results
-    paginated_requests = filtered_requests[skip:skip + limit]
-    return paginated_requests
+    if hostname:
+        query = query.filter(database.BlockedRequest.target_hostname == hostname)
+
+    requests = query.order_by(
+        database.BlockedRequest.timestamp.desc()
+    ).offset(skip).limit(limit).all()
+    return requests
 
 
 @app.get("/api/stats", response_model=StatsResponse)
 def get_stats(db: Session = Depends(database.get_db)):
     """Get statistics about blocked requests"""
-    # Total requests
-    total = db.query(database.BlockedRequest).count()
+    cached = get_cached_stats("stats")
+    if cached is not None:
+        return cached
 
-    # Today's requests
+    # Total and today's requests in a single pass
     today = datetime.utcnow().date()
-    today_count = db.query(database.BlockedRequest).filter(
-        database.BlockedRequest.timestamp >= datetime.combine(today, datetime.min.time())
-    ).count()
-
-    # Top blocked domains
-    from sqlalchemy import func
-    domain_stats = db.query(
-        database.BlockedRequest.target_hostname,
-        func.count(database.BlockedRequest.id).label('count')
-    ).group_by(
-        database.BlockedRequest.target_hostname
-    ).order_by(
-        func.count(database.BlockedRequest.id).desc()
-    ).limit(10).all()
-
-    blocked_domains = [{"hostname": host, "count": count} for host, count in domain_stats]
-
-    # Recent activity (last 7 days)
+    start_of_today = datetime.combine(today, datetime.min.time())
+    total, today_count = db.query(
+        func.count(database.BlockedRequest.id),
+        func.sum(case((database.BlockedRequest.timestamp >= start_of_today, 1), else_=0))
+    ).one()
+    # SUM() is NULL on an empty table
+    today_count = today_count or 0
+
+    # Top blocked domains; rows are labelled to match BlockedDomain
+    blocked_domains = db.execute(
+        select(
+            database.BlockedRequest.target_hostname.label('hostname'),
+            func.count(database.BlockedRequest.id).label('count')
+        ).group_by(
+            database.BlockedRequest.target_hostname
+        ).order_by(
+            func.count(database.BlockedRequest.id).desc()
+        ).limit(10)
+    ).mappings().all()
+
+    # Recent activity (last 7 days); rows are labelled to match RecentActivity
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    daily_stats = db.query(
-        func.date(database.BlockedRequest.timestamp).label('date'),
-        func.count(database.BlockedRequest.id).label('count')
-    ).filter(
-        database.BlockedRequest.timestamp >= seven_days_ago
-    ).group_by(
-        func.date(database.BlockedRequest.timestamp)
-    ).order_by('date').all()
-
-    recent_activity = [{"date": str(date), "count": count} for date, count in daily_stats]
-
-    return {
-        "total_requests": total,
-        "today_requests": today_count,
-        "blocked_domains": blocked_domains,
-        "recent_activity": recent_activity
-    }
+    recent_activity = db.execute(
+        select(
+            cast(func.date(database.BlockedRequest.timestamp), String).label('date'),
+            func.count(database.BlockedRequest.id).label('count')
+        ).where(
+            database.BlockedRequest.timestamp >= seven_days_ago
+        ).group_by(
+            func.date(database.BlockedRequest.timestamp)
+        ).order_by('date')
+    ).mappings().all()
+
+    stats = StatsResponse(
+        total_requests=total,
+        today_requests=today_count,
+        blocked_domains=blocked_domains,
+        recent_activity=recent_activity
+    )
+    set_cached_stats("stats", stats)
+    return stats
 
 
 @app.delete("/api/blocked-requests/{request_id}")
@@ -322,6 +430,7 @@ def delete_blocked_request(request_id: int, db: Session = Depends(database.get_d
 
     db.delete(request)
     db.commit()
+    invalidate_stats("stats", "classification")
     return {"message": "Request deleted successfully"}
 
 
@@ -330,6 +439,7 @@ def clear_all_requests(db: Session = Depends(database.get_db)):
     """Clear all blocked requests"""
     count = db.query(database.BlockedRequest).delete()
     db.commit()
+    invalidate_stats("stats", "classification")
     return {"message": f"Deleted {count} requests"}
 
 
@@ -341,20 +451,15 @@ def get_human_requests(
     db: Session = Depends(database.get_db)
 ):
     """Get human-initiated POST requests with user input data (on button click)"""
-    all_requests = db.query(database.BlockedRequest).filter(
+    requests = db.query(database.BlockedRequest).options(
+        load_only(*BLOCKED_REQUEST_RESPONSE_COLUMNS),
+        raiseload('*')
+    ).filter(
         database.BlockedRequest.is_bot == False,
-        database.BlockedRequest.has_click_correlation == True
-    ).order_by(database.BlockedRequest.timestamp.desc()).all()
-
-    # Filter for requests with matched_fields and matched_values
-    filtered_requests = [
-        req for req in all_requests
-        if req.matched_fields and len(req.matched_fields) > 0
-        and req.matched_values and len(req.matched_values) > 0
-    ]
-
-    paginated_requests = filtered_requests[skip:skip + limit]
-    return paginated_requests
+        database.BlockedRequest.has_click_correlation == True,
+        database.BlockedRequest.has_matched_fields == True
+    ).order_by(database.BlockedRequest.timestamp.desc()).offset(skip).limit(limit).all()
+    return requests
 
 
 @app.get("/api/blocked-requests/human/background", response_model=List[BlockedRequestResponse])
@@ -364,20 +469,15 @@ def get_human_background_requests(
     db: Session = Depends(database.get_db)
 ):
     """Get human background requests (is_bot=False with no user input data)"""
-    all_requests = db.query(database.BlockedRequest).filter(
-        database.BlockedRequest.is_bot == False
-    ).order_by(database.BlockedRequest.timestamp.desc()).all()
-
-    # Filter for requests with NO matched_fields or matched_values (background activity)
-    background_requests = [
-        req for req in all_requests
-        if (not req.matched_fields or len(req.matched_fields) == 0)
-        or (not req.matched_values or len(req.matched_values) == 0)
-    ]
-
-    # Apply pagination
-    paginated_requests = background_requests[skip:skip + limit]
-    return paginated_requests
+    # Requests with NO matched_fields or matched_values (background activity)
+    requests = db.query(database.BlockedRequest).options(
+        load_only(*BLOCKED_REQUEST_RESPONSE_COLUMNS),
+        raiseload('*')
+    ).filter(
+        database.BlockedRequest.is_bot == False,
+        database.BlockedRequest.has_matched_fields == False
+    ).order_by(database.BlockedRequest.timestamp.desc()).offset(skip).limit(limit).all()
+    return requests
 
 
 @app.get("/api/blocked-requests/bot", response_model=List[BlockedRequestResponse])
@@ -387,35 +487,44 @@ def get_bot_requests(
     db: Session = Depends(database.get_db)
 ):
     """Get only bot-initiated requests (is_bot=True)"""
-    requests = db.query(database.BlockedRequest).filter(
-        database.BlockedRequest.is_bot == True
-    ).order_by(database.BlockedRequest.timestamp.desc()).offset(skip).limit(limit).all()
+    # Read-only: plain rows, no ORM identity map or change tracking
+    requests = db.execute(
+        select(*BLOCKED_REQUEST_RESPONSE_COLUMNS).where(
+            database.BlockedRequest.is_bot == True
+        ).order_by(database.BlockedRequest.timestamp.desc()).offset(skip).limit(limit)
+    ).mappings().all()
     return requests
 
 
 @app.get("/api/stats/classification", response_model=ClassificationStatsResponse)
 def get_classification_stats(db: Session = Depends(database.get_db)):
     """Get human/bot classification statistics"""
-    total_count = db.query(database.BlockedRequest).count()
-    human_count = db.query(database.BlockedRequest).filter(
-        database.BlockedRequest.is_bot == False
-    ).count()
-    bot_count = db.query(database.BlockedRequest).filter(
-        database.BlockedRequest.is_bot == True
-    ).count()
-    uncorrelated_count = db.query(database.BlockedRequest).filter(
-        database.BlockedRequest.has_click_correlation == False
-    ).count()
+    cached = get_cached_stats("classification")
+    if cached is not None:
+        return cached
+
+    total_count, human_count, bot_count, uncorrelated_count = db.query(
+        func.count(database.BlockedRequest.id),
+        func.sum(case((database.BlockedRequest.is_bot == False, 1), else_=0)),
+        func.sum(case((database.BlockedRequest.is_bot == True, 1), else_=0)),
+        func.sum(case((database.BlockedRequest.has_click_correlation == False, 1), else_=0))
+    ).one()
+    # SUM() is NULL on an empty table
+    human_count = human_count or 0
+    bot_count = bot_count or 0
+    uncorrelated_count = uncorrelated_count or 0
 
     correlation_rate = ((human_count + bot_count) / total_count * 100) if total_count > 0 else 0.0
 
-    return {
+    stats = {
         "total_requests": total_count,
         "human_requests": human_count,
         "bot_requests": bot_count,
         "uncorrelated_requests": uncorrelated_count,
         "correlation_rate": correlation_rate
     }
+    set_cached_stats("classification", stats)
+    return stats
 
 
 # Whitelist endpoints
@@ -452,7 +561,9 @@ def add_to_whitelist(
 @app.get("/api/whitelist", response_model=List[WhitelistResponse])
 def get_whitelist(db: Session = Depends(database.get_db)):
     """Get all whitelisted URLs"""
-    whitelist = db.query(database.Whitelist).order_by(database.Whitelist.added_at.desc()).all()
+    whitelist = db.query(database.Whitelist).options(
+        raiseload('*')
+    ).order_by(database.Whitelist.added_at.desc()).all()
     return whitelist
 
 
@@ -502,24 +613,26 @@ def correlate_click(dom_click: dict) -> ClickCorrelationResult:
     """Check if DOM click matches any recent OS click"""
     time_window_sec = TIME_WINDOW_MS / 1000.0
 
-    if not os_clicks:
+    if not os_click_timestamps:
         return ClickCorrelationResult(
             is_suspicious=True,
             confidence=0.9,
             reason="No OS clicks recorded"
         )
 
-    for os_click in reversed(os_clicks):
-        time_diff = abs(dom_click['timestamp'] - os_click['timestamp'])
-
-        if time_diff > time_window_sec:
-            break
-
-        return ClickCorrelationResult(
-            is_suspicious=False,
-            confidence=1.0,
-            reason=None
-        )
+    # Only search when the newest OS click (the last entry, as the buffer is
+    # sorted) is within the window; synthetic clicks usually fail this first
+    timestamp = dom_click['timestamp']
+    if timestamp - os_click_timestamps[-1] <= time_window_sec:
+        # Earliest OS click not older than the window; legitimate if it also
+        # isn't newer than the window
+        index = bisect_left(os_click_timestamps, timestamp - time_window_sec)
+        if index < len(os_click_timestamps) and os_click_timestamps[index] <= timestamp + time_window_sec:
+            return ClickCorrelationResult(
+                is_suspicious=False,
+                confidence=1.0,
+                reason=None
+            )
 
     return ClickCorrelationResult(
         is_suspicious=True,
@@ -528,6 +641,39 @@ def correlate_click(dom_click: dict) -> ClickCorrelationResult:
     )
 
 
+def write_click_batch(rows: List[dict]):
+    """Insert a batch of DOM click rows in a single executemany"""
+    db = database.SessionLocal()
+    try:
+        db.execute(insert(database.ClickEvent), rows)
+        db.commit()
+        invalidate_stats("click_stats")
+    finally:
+        db.close()
+
+
+async def click_writer():
+    """Drain click_write_queue, writing up to CLICK_BATCH_SIZE rows per commit"""
+    running = True
+    while running:
+        rows = [await click_write_queue.get()]
+        # Give concurrent clicks a moment to join this batch
+        await asyncio.sleep(CLICK_FLUSH_INTERVAL_MS / 1000.0)
+        while len(rows) < CLICK_BATCH_SIZE and not click_write_queue.empty():
+            rows.append(click_write_queue.get_nowait())
+
+        if None in rows:
+            running = False
+            rows = [row for row in rows if row is not None]
+        if not rows:
+            continue
+
+        try:
+            await run_in_threadpool(write_click_batch, rows)
+        except Exception:
+            logger.exception("[Click Detection] Failed to store %d clicks", len(rows))
+
+
 @app.get("/api/click-detection/health")
 def click_detection_health():
     """Health check for click detection"""
@@ -537,24 +683,27 @@ def click_detection_health():
 @app.get("/api/click-detection/stats", response_model=ClickStatsResponse)
 def get_click_stats(db: Session = Depends(database.get_db)):
     """Get click detection statistics"""
-    from sqlalchemy import func
+    stats = get_cached_stats("click_stats")
+    if stats is None:
+        total = db.query(database.ClickEvent).count()
+        suspicious = db.query(database.ClickEvent).filter(
+            database.ClickEvent.is_suspicious == True
+        ).count()
+        legitimate = db.query(database.ClickEvent).filter(
+            database.ClickEvent.is_suspicious == False
+        ).count()
+        unique_pages = db.query(func.count(func.distinct(database.ClickEvent.page_url))).scalar()
+
+        stats = {
+            "total_clicks": total,
+            "suspicious_clicks": suspicious,
+            "legitimate_clicks": legitimate,
+            "unique_pages": unique_pages
+        }
+        set_cached_stats("click_stats", stats)
 
-    total = db.query(database.ClickEvent).count()
-    suspicious = db.query(database.ClickEvent).filter(
-        database.ClickEvent.is_suspicious == True
-    ).count()
-    legitimate = db.query(database.ClickEvent).filter(
-        database.ClickEvent.is_suspicious == False
-    ).count()
-    unique_pages = db.query(func.count(func.distinct(database.ClickEvent.page_url))).scalar()
-
-    return {
-        "total_clicks": total,
-        "suspicious_clicks": suspicious,
-        "legitimate_clicks": legitimate,
-        "unique_pages": unique_pages,
-        "total_os_clicks": len(os_clicks)
-    }
+    # The OS click buffer is in memory, so its size is always reported live
+    return {**stats, "total_os_clicks": len(os_click_timestamps)}
 
 
 @app.get("/api/click-detection/suspicious", response_model=List[ClickEventResponse])
@@ -563,9 +712,12 @@ def get_suspicious_clicks(
     db: Session = Depends(database.get_db)
 ):
     """Get suspicious clicks"""
-    clicks = db.query(database.ClickEvent).filter(
-        database.ClickEvent.is_suspicious == True
-    ).order_by(database.ClickEvent.created_at.desc()).limit(limit).all()
+    # Read-only: plain rows, no ORM identity map or change tracking
+    clicks = db.execute(
+        select(*CLICK_EVENT_RESPONSE_COLUMNS).where(
+            database.ClickEvent.is_suspicious == True
+        ).order_by(database.ClickEvent.created_at.desc()).limit(limit)
+    ).mappings().all()
     return clicks
 
 
@@ -575,54 +727,42 @@ def get_recent_clicks(
     db: Session = Depends(database.get_db)
 ):
     """Get recent clicks"""
-    clicks = db.query(database.ClickEvent).order_by(
-        database.ClickEvent.created_at.desc()
-    ).limit(limit).all()
+    # Read-only: plain rows, no ORM identity map or change tracking
+    clicks = db.execute(
+        select(*CLICK_EVENT_RESPONSE_COLUMNS).order_by(
+            database.ClickEvent.created_at.desc()
+        ).limit(limit)
+    ).mappings().all()
     return clicks
 
 
 @app.get("/api/click-detection/actions", response_model=List[ActionSummary])
 def get_action_summary(db: Session = Depends(database.get_db)):
     """Get action summary"""
-    from sqlalchemy import func, case
-
-    results = db.query(
-        database.ClickEvent.action_type,
-        func.count(database.ClickEvent.id).label('count'),
-        func.sum(
-            case((database.ClickEvent.is_suspicious == True, 1), else_=0)
-        ).label('suspicious_count')
-    ).group_by(database.ClickEvent.action_type).all()
-
-    return [
-        {
-            "action_type": row[0],
-            "count": row[1],
-            "suspicious_count": row[2]
-        }
-        for row in results
-    ]
+    # Row keys match ActionSummary, so rows are validated as-is
+    return db.execute(
+        select(
+            database.ClickEvent.action_type,
+            func.count(database.ClickEvent.id).label('count'),
+            func.sum(
+                case((database.ClickEvent.is_suspicious == True, 1), else_=0)
+            ).label('suspicious_count')
+        ).group_by(database.ClickEvent.action_type)
+    ).mappings().all()
 
 
 @app.post("/api/click-detection/events/os")
-def record_os_click(event: OSClickEvent):
+async def record_os_click(event: OSClickEvent):
     """Record an OS click event"""
-    click = {
-        'source': 'os',
-        'x': event.x,
-        'y': event.y,
-        'timestamp': event.timestamp
-    }
-    os_clicks.append(click)
-    print(f"[Click Detection] OS click recorded: x={click['x']:.1f}, y={click['y']:.1f}, time={click['timestamp']:.3f}")
+    insort(os_click_timestamps, event.timestamp)
+    if len(os_click_timestamps) > OS_CLICK_BUFFER_SIZE:
+        del os_click_timestamps[0]
+    logger.info("[Click Detection] OS click recorded: x=%.1f, y=%.1f, time=%.3f", event.x, event.y, event.timestamp)
     return {"success": True}
 
 
 @app.post("/api/click-detection/events/dom", response_model=ClickCorrelationResult)
-def record_dom_click(
-    event: DOMClickEvent,
-    db: Session = Depends(database.get_db)
-):
+async def record_dom_click(event: DOMClickEvent):
     """Record a DOM click event and correlate with OS clicks"""
     click = {
         'x': event.x,
@@ -633,31 +773,29 @@ def record_dom_click(
     # Correlate with OS clicks
     result = correlate_click(click)
 
-    # Store in database
-    db_click = database.ClickEvent(
-        timestamp=event.timestamp,
-        x=event.x,
-        y=event.y,
-        is_suspicious=result.is_suspicious,
-        confidence=result.confidence,
-        reason=result.reason,
-        action_type=event.action_type,
-        action_details=event.action_details,
-        page_url=event.page_url,
-        page_title=event.page_title,
-        target_tag=event.target_tag,
-        target_id=event.target_id,
-        target_class=event.target_class,
-        is_trusted=event.is_trusted
-    )
-    db.add(db_click)
-    db.commit()
-    db.refresh(db_click)
+    # Queue for a batched write; the response only depends on the correlation
+    await click_write_queue.put({
+        'timestamp': event.timestamp,
+        'x': event.x,
+        'y': event.y,
+        'is_suspicious': result.is_suspicious,
+        'confidence': result.confidence,
+        'reason': result.reason,
+        'action_type': event.action_type,
+        'action_details': event.action_details,
+        'page_url': event.page_url,
+        'page_title': event.page_title,
+        'target_tag': event.target_tag,
+        'target_id': event.target_id,
+        'target_class': event.target_class,
+        'is_trusted': event.is_trusted,
+        'created_at': datetime.utcnow()
+    })
 
     if result.is_suspicious:
-        print(f"[Click Detection] ⚠️  SUSPICIOUS {event.action_type}: {event.page_title} - {result.reason}")
+        logger.warning("[Click Detection] ⚠️  SUSPICIOUS %s: %s - %s", event.action_type, event.page_title, result.reason)
     else:
-        print(f"[Click Detection] ✓ Legitimate {event.action_type}: {event.page_title}")
+        logger.info("[Click Detection] ✓ Legitimate %s: %s", event.action_type, event.page_title)
 
     return result
 